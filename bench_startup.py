@@ -0,0 +1,157 @@
+"""
+Startup-time benchmark.
+
+Reports:
+  - import cost of the bot modules, from `python -X importtime`
+  - DatabaseManager setup on a fresh database vs. one at the current schema
+  - time-to-first-update: wall time from launching a cold interpreter until
+    it has dispatched its first update to a handler (needs python-telegram-bot)
+
+Usage:
+    python bench_startup.py [--runs N]
+"""
+import argparse
+import importlib.util
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MODULES = ['database', 'scheduler', 'commands', 'bot']
+
+
+def import_times(module):
+    """Return {module_name: cumulative_us} from `python -X importtime -c 'import module'`"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=HERE, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def bench_imports(runs):
+    print('Import time (cumulative, median of %d runs)' % runs)
+    for module in MODULES:
+        try:
+            samples = [import_times(module)[module] for _ in range(runs)]
+        except RuntimeError as e:
+            print(f'  {module:<12} skipped ({e})')
+            continue
+        print(f'  {module:<12} {statistics.median(samples) / 1000:8.2f} ms')
+
+
+def bench_database(runs):
+    from database import DatabaseManager
+
+    cold, warm = [], []
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, 'bench.db')
+            start = time.perf_counter()
+            DatabaseManager(db_path)
+            cold.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            DatabaseManager(db_path)
+            warm.append(time.perf_counter() - start)
+
+    print('DatabaseManager setup (median of %d runs)' % runs)
+    print(f'  fresh database   {statistics.median(cold) * 1000:8.2f} ms')
+    print(f'  current schema   {statistics.median(warm) * 1000:8.2f} ms')
+
+
+# Run with `python -c` in a fresh interpreter so that nothing this script
+# imports is counted. Exits non-zero unless the update reached a handler.
+FIRST_UPDATE_CHILD = """
+import asyncio, sys, time
+from unittest import mock
+from telegram import Update, User
+from bot import TelegramBot
+
+bot = TelegramBot('123456:BENCHMARK', db_name=sys.argv[1])
+handled = []
+handle_text = bot.handle_text
+
+async def record(update, context):
+    handled.append(update.update_id)
+    await handle_text(update, context)
+
+bot.handle_text = record
+app = bot.build_application()
+
+# initialize() would call getMe; answer it locally so no network is needed.
+# Bot uses __slots__, so the stub has to go on the class.
+async def get_me(self, *args, **kwargs):
+    self._bot_user = User(id=123456, is_bot=True, first_name='Benchmark', username='benchmark_bot')
+    return self._bot_user
+
+async def first_update():
+    await app.initialize()
+    # A plain private-chat text message: handled without any network calls
+    update = Update.de_json({
+        'update_id': 1,
+        'message': {
+            'message_id': 1,
+            'date': int(time.time()),
+            'chat': {'id': 1, 'type': 'private'},
+            'from': {'id': 1, 'is_bot': False, 'first_name': 'Bench'},
+            'text': 'hello',
+        },
+    }, app.bot)
+    await app.process_update(update)
+    await app.shutdown()
+
+with mock.patch.object(type(app.bot), 'get_me', get_me):
+    asyncio.run(first_update())
+if handled != [1]:
+    sys.exit('update was not dispatched to a handler')
+"""
+
+
+def bench_first_update(runs):
+    print('Time to first update (cold interpreter, median of %d runs)' % runs)
+    if importlib.util.find_spec('telegram') is None:
+        print('  skipped (python-telegram-bot is not installed)')
+        return
+
+    samples = []
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        for _ in range(runs):
+            start = time.perf_counter()
+            result = subprocess.run(
+                [sys.executable, '-c', FIRST_UPDATE_CHILD, db_path],
+                cwd=HERE, capture_output=True, text=True
+            )
+            elapsed = time.perf_counter() - start
+            if result.returncode != 0:
+                raise RuntimeError(f'first-update run failed:\n{result.stderr.strip()}')
+            samples.append(elapsed)
+    print(f'  first update     {statistics.median(samples) * 1000:8.2f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    sys.path.insert(0, HERE)
+    bench_imports(args.runs)
+    bench_database(args.runs)
+    bench_first_update(args.runs)
+
+
+if __name__ == '__main__':
+    main()
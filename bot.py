@@ -1,22 +1,40 @@
-from telegram import Update, ReplyKeyboardMarkup, KeyboardButton, Poll, PollOption, Location
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes, PollHandler
+from __future__ import annotations
+
 import os
 import logging
+from typing import TYPE_CHECKING
 from commands import handle_command
 from database import DatabaseManager
 from scheduler import ScheduleManager
+from locations import LiveLocationBuffer, LOCATION_MAX_AGE_HOURS
+from media_groups import MediaGroupBuffer, MAX_CONCURRENT_DOWNLOADS
+
+# Default and maximum search radius for /nearby, in kilometres
+NEARBY_DEFAULT_RADIUS_KM = 1.0
+NEARBY_MAX_RADIUS_KM = 50.0
+NEARBY_MAX_RESULTS = 10
+
+# The telegram stack and asyncio are imported where they are used so that
+# importing this module (e.g. for maintenance scripts) stays cheap
+if TYPE_CHECKING:
+    from telegram import Update
+    from telegram.ext import ContextTypes
 
 class TelegramBot:
-    def __init__(self, token):
+    def __init__(self, token, db_name='bot.db'):
         self.token = token
-        self.db = DatabaseManager('bot.db')
+        self.db = DatabaseManager(db_name)
         self.scheduler = ScheduleManager(self.db)
+        self.live_locations = LiveLocationBuffer(self.db)
+        self.albums = MediaGroupBuffer(self.save_album)
         logging.basicConfig(
             format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
             level=logging.INFO
         )
 
     async def start(self, update: Update, context: ContextTypes):
+        from telegram import ReplyKeyboardMarkup, KeyboardButton
+
         keyboard = [
             [KeyboardButton('Share Location', request_location=True)],
             [KeyboardButton('Create Poll')]
@@ -29,6 +47,7 @@ class TelegramBot:
             "/list_tasks\n"
             "/notify\n"
             "/create_poll <question> | option1 | option2 | ...\n"
+            "/nearby [radius_km]\n"
             "/help\n"
             "You can also send:\n"
             "- Documents\n"
@@ -59,48 +78,102 @@ class TelegramBot:
             response += f"\u2022 ID: {task[0]} - {task[3]} (Status: {task[4]})\n"
         await update.message.reply_text(response)
 
+    def _media_item(self, message):
+        """Return (media_type, file_id, file_path, caption) for a document or photo message"""
+        if message.document:
+            doc = message.document
+            os.makedirs('documents', exist_ok=True)
+            return 'document', doc.file_id, f"documents/{doc.file_name}", doc.file_name
+
+        photo = message.photo[-1]
+        os.makedirs('photos', exist_ok=True)
+        return 'photo', photo.file_id, f"photos/{photo.file_id}.jpg", message.caption or "No caption"
+
     async def handle_document(self, update: Update, context: ContextTypes):
+        if update.message.media_group_id:
+            self.albums.add(update.message.media_group_id, (update, context))
+            return
+
         try:
-            doc = update.message.document
-            file = await context.bot.get_file(doc.file_id)
-            
-            os.makedirs('documents', exist_ok=True)
-            file_path = f"documents/{doc.file_name}"
-            
+            media_type, file_id, file_path, caption = self._media_item(update.message)
+            file = await context.bot.get_file(file_id)
             await file.download_to_drive(file_path)
             
-            self.db.save_media('document', file_path, doc.file_name, update.effective_user.id)
-            await update.message.reply_text(f"Document saved: {doc.file_name}")
+            self.db.save_media(media_type, file_path, caption, update.effective_user.id)
+            await update.message.reply_text(f"Document saved: {caption}")
             
         except Exception as e:
             await update.message.reply_text("Failed to process document. Please try again.")
             logging.error(f"Document handling error: {str(e)}")
 
     async def handle_photo(self, update: Update, context: ContextTypes):
+        if update.message.media_group_id:
+            self.albums.add(update.message.media_group_id, (update, context))
+            return
+
         try:
-            photo = update.message.photo[-1]
-            file = await context.bot.get_file(photo.file_id)
-        
-            os.makedirs('photos', exist_ok=True)
-            file_path = f"photos/{photo.file_id}.jpg"
-        
+            media_type, file_id, file_path, caption = self._media_item(update.message)
+            file = await context.bot.get_file(file_id)
             await file.download_to_drive(file_path)
-            caption = update.message.caption or "No caption"
-            self.db.save_media('photo', file_path, caption, update.effective_user.id)
+            
+            self.db.save_media(media_type, file_path, caption, update.effective_user.id)
             await update.message.reply_text("Photo saved!")
             
         except Exception as e:
             await update.message.reply_text("Failed to process photo. Please try again.")
             logging.error(f"Photo handling error: {str(e)}")
 
+    async def save_album(self, media_group_id, items):
+        """Download every file of an album concurrently and save them together"""
+        import asyncio
+
+        first_update, context = items[0]
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_DOWNLOADS)
+
+        async def download(update):
+            media_type, file_id, file_path, caption = self._media_item(update.message)
+            async with semaphore:
+                file = await context.bot.get_file(file_id)
+                await file.download_to_drive(file_path)
+            return media_type, file_path, caption
+
+        results = await asyncio.gather(
+            *(download(update) for update, _ in items),
+            return_exceptions=True
+        )
+        saved = [result for result in results if not isinstance(result, Exception)]
+        for result in results:
+            if isinstance(result, Exception):
+                logging.error(f"Album {media_group_id} download error: {str(result)}")
+
+        if not saved:
+            await first_update.message.reply_text("Failed to process album. Please try again.")
+            return
+
+        try:
+            self.db.save_media_batch(saved, first_update.effective_user.id)
+        except Exception as e:
+            await first_update.message.reply_text("Failed to process album. Please try again.")
+            logging.error(f"Album {media_group_id} save error: {str(e)}")
+            return
+
+        photos = sum(1 for media_type, _, _ in saved if media_type == 'photo')
+        documents = len(saved) - photos
+        response = f"Album saved: {photos} photo(s), {documents} document(s)."
+        if len(saved) < len(results):
+            response += f" {len(results) - len(saved)} item(s) failed, please try again."
+        await first_update.message.reply_text(response)
+
     async def handle_location(self, update: Update, context: ContextTypes):
         try:
             location = update.message.location
             latitude = location.latitude
             longitude = location.longitude
             
-            location_data = f"{latitude},{longitude}"
-            self.db.save_media('location', location_data, '', update.effective_user.id)
+            if location.live_period:
+                self.live_locations.update(update.effective_user.id, latitude, longitude)
+            else:
+                self.db.save_location(update.effective_user.id, latitude, longitude)
             
             await update.message.reply_text(
                 f"Location received!\nLatitude: {latitude}\nLongitude: {longitude}"
@@ -110,6 +183,48 @@ class TelegramBot:
             await update.message.reply_text("Failed to process location. Please try again.")
             logging.error(f"Location handling error: {str(e)}")
 
+    async def handle_live_location(self, update: Update, context: ContextTypes):
+        try:
+            location = update.edited_message.location
+            self.live_locations.update(
+                update.effective_user.id,
+                location.latitude,
+                location.longitude
+            )
+        except Exception as e:
+            logging.error(f"Live location handling error: {str(e)}")
+
+    async def nearby(self, update: Update, context: ContextTypes):
+        try:
+            radius_km = float(context.args[0]) if context.args else NEARBY_DEFAULT_RADIUS_KM
+            if not 0 < radius_km <= NEARBY_MAX_RADIUS_KM:
+                raise ValueError(radius_km)
+        except ValueError:
+            await update.message.reply_text(
+                f"Usage: /nearby [radius_km] (up to {NEARBY_MAX_RADIUS_KM:g} km)"
+            )
+            return
+
+        user_id = update.effective_user.id
+        # Make sure the caller's own pending live point is on disk
+        self.live_locations.flush_user(user_id)
+        origin = self.db.get_last_location(user_id, max_age_hours=LOCATION_MAX_AGE_HOURS)
+        if not origin:
+            await update.message.reply_text("Share your location first to search nearby.")
+            return
+
+        results = self.db.find_nearby(origin[0], origin[1], radius_km, user_id)
+        if not results:
+            await update.message.reply_text(
+                f"No one from your groups found within {radius_km:g} km."
+            )
+            return
+
+        response = f"Group members within {radius_km:g} km:\n"
+        for other_id, _, _, distance in results[:NEARBY_MAX_RESULTS]:
+            response += f"\u2022 User {other_id} - {distance:.2f} km\n"
+        await update.message.reply_text(response)
+
     async def handle_text(self, update: Update, context: ContextTypes):
         message = update.message.text
         
@@ -168,25 +283,39 @@ class TelegramBot:
         except Exception as e:
             logging.error(f"Poll answer handling error: {str(e)}")
 
-    def run(self):
-        app = Application.builder().token(self.token).build()
+    async def _on_stop(self, app):
+        """Finish albums still inside their window or downloading"""
+        # post_stop runs before the bot is shut down, so downloads and the
+        # summary replies can still reach Telegram
+        await self.albums.drain()
+
+    def build_application(self):
+        from telegram.ext import Application, CommandHandler, MessageHandler, filters, PollHandler
+
+        app = Application.builder().token(self.token).post_stop(self._on_stop).build()
         
         # Command handlers
         app.add_handler(CommandHandler("start", self.start))
         app.add_handler(CommandHandler("add_task", self.add_task))
         app.add_handler(CommandHandler("list_tasks", self.list_tasks))
         app.add_handler(CommandHandler("create_poll", self.create_poll))
+        app.add_handler(CommandHandler("nearby", self.nearby))
         app.add_handler(CommandHandler("notify", lambda u, c: handle_command(u, c, self.db, self.scheduler)))
         app.add_handler(CommandHandler("help", lambda u, c: handle_command(u, c, self.db, self.scheduler)))
         
         # Media and message handlers
-        app.add_handler(MessageHandler(filters.Document.ALL, self.handle_document))
-        app.add_handler(MessageHandler(filters.LOCATION, self.handle_location))
-        app.add_handler(MessageHandler(filters.PHOTO, self.handle_photo))
+        app.add_handler(MessageHandler(filters.UpdateType.MESSAGE & filters.Document.ALL, self.handle_document))
+        app.add_handler(MessageHandler(filters.UpdateType.MESSAGE & filters.LOCATION, self.handle_location))
+        app.add_handler(MessageHandler(filters.UpdateType.EDITED_MESSAGE & filters.LOCATION, self.handle_live_location))
+        app.add_handler(MessageHandler(filters.UpdateType.MESSAGE & filters.PHOTO, self.handle_photo))
         app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_text))
         app.add_handler(PollHandler(self.handle_poll_answer))
+        return app
+
+    def run(self):
+        app = self.build_application()
         
-        # Start the scheduler
+        # The scheduler thread itself only starts once a task is scheduled
         self.scheduler.start()
 
         try:
@@ -194,6 +323,8 @@ class TelegramBot:
         except Exception as e:
             print(f"Error occurred: {e}")
             logging.error(f"Bot runtime error: {str(e)}")
+        finally:
+            self.live_locations.flush()
 
 if __name__ == '__main__':
     # Remember to keep your token secret and not share it publicly
@@ -1,8 +1,13 @@
-from telegram import Update
-from telegram.ext import ContextTypes
+from __future__ import annotations
+
 from datetime import datetime
+from typing import TYPE_CHECKING
 from database import DatabaseManager
 
+if TYPE_CHECKING:
+    from telegram import Update
+    from telegram.ext import ContextTypes
+
 async def handle_command(update: Update, context: ContextTypes.DEFAULT_TYPE, db: DatabaseManager, scheduler):
     command = update.message.text.split()[0].lower()
     
@@ -43,12 +48,13 @@ Available commands:
 /list_tasks - Show all tasks
 /notify - Get notifications of tasks
 /create_poll <question> | option1 | option2 | ... - Create a poll
+/nearby [radius_km] - Find group members near your last shared location
 
 You can also send:
 - Documents (saved automatically)
 - Photos (saved automatically)
 - Links (saved automatically)
-- Location (using the Share Location button)
+- Location (using the Share Location button, live locations supported)
 - Group messages (monitored)
 """
         await update.message.reply_text(help_text)
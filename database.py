@@ -1,6 +1,10 @@
 import sqlite3
-from datetime import datetime
+from datetime import datetime, timedelta
 import logging
+from locations import grid_cell, haversine_km, cell_bounds, LOCATION_MAX_AGE_HOURS
+
+# Bump whenever setup_database changes the schema
+SCHEMA_VERSION = 2
 
 class DatabaseManager:
     def __init__(self, db_name):
@@ -11,6 +15,11 @@ class DatabaseManager:
         with sqlite3.connect(self.db_name) as conn:
             cursor = conn.cursor()
             
+            # Skip the DDL entirely when the schema is already current
+            cursor.execute('PRAGMA user_version')
+            if cursor.fetchone()[0] >= SCHEMA_VERSION:
+                return
+            
             # Tasks table
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS tasks (
@@ -46,6 +55,15 @@ class DatabaseManager:
                     created_at TIMESTAMP
                 )
             ''')
+            # Both directions of the shared-group lookup in find_nearby
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_group_messages_user
+                ON group_messages (user_id, group_id)
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_group_messages_group
+                ON group_messages (group_id, user_id)
+            ''')
             
             # Polls table
             cursor.execute('''
@@ -70,8 +88,60 @@ class DatabaseManager:
                 )
             ''')
             
+            # Locations table, indexed by grid cell for radius lookups
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'locations'"
+            )
+            locations_exists = cursor.fetchone() is not None
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS locations (
+                    id INTEGER PRIMARY KEY,
+                    user_id INTEGER,
+                    latitude REAL,
+                    longitude REAL,
+                    cell_lat INTEGER,
+                    cell_lon INTEGER,
+                    live INTEGER DEFAULT 0,
+                    created_at TIMESTAMP
+                )
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_locations_cell
+                ON locations (cell_lat, cell_lon)
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_locations_user
+                ON locations (user_id, created_at)
+            ''')
+            if not locations_exists:
+                self._migrate_media_locations(cursor)
+            
+            cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
             conn.commit()
     
+    def _migrate_media_locations(self, cursor):
+        """Move legacy "lat,lon" rows from the media table into locations"""
+        cursor.execute(
+            "SELECT id, content, user_id, created_at FROM media WHERE type = 'location'"
+        )
+        rows = []
+        migrated_ids = []
+        for media_id, content, user_id, created_at in cursor.fetchall():
+            try:
+                latitude, longitude = (float(part) for part in content.split(','))
+            except (AttributeError, ValueError):
+                logging.warning(f"Skipping malformed location media row {media_id}")
+                continue
+            cell_lat, cell_lon = grid_cell(latitude, longitude)
+            rows.append((user_id, latitude, longitude, cell_lat, cell_lon, created_at))
+            migrated_ids.append((media_id,))
+        cursor.executemany('''
+            INSERT INTO locations (user_id, latitude, longitude, cell_lat, cell_lon, live, created_at)
+            VALUES (?, ?, ?, ?, ?, 0, ?)
+        ''', rows)
+        # Malformed rows stay in media so nothing is lost
+        cursor.executemany('DELETE FROM media WHERE id = ?', migrated_ids)
+    
     def add_task(self, user_id, task_type, description, scheduled_time):
         with sqlite3.connect(self.db_name) as conn:
             cursor = conn.cursor()
@@ -100,6 +170,108 @@ class DatabaseManager:
                 VALUES (?, ?, ?, ?, ?)
             ''', (media_type, content, caption, user_id, datetime.now()))
             
+    def save_media_batch(self, items, user_id):
+        """
+        Save several media rows in a single transaction
+
+        Args:
+            items (list): (media_type, content, caption) tuples
+            user_id (int): Telegram user ID
+        """
+        now = datetime.now()
+        with sqlite3.connect(self.db_name) as conn:
+            cursor = conn.cursor()
+            cursor.executemany('''
+                INSERT INTO media (type, content, caption, user_id, created_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', [(media_type, content, caption, user_id, now)
+                  for media_type, content, caption in items])
+    
+    def save_location(self, user_id, latitude, longitude):
+        cell_lat, cell_lon = grid_cell(latitude, longitude)
+        with sqlite3.connect(self.db_name) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO locations (user_id, latitude, longitude, cell_lat, cell_lon, live, created_at)
+                VALUES (?, ?, ?, ?, ?, 0, ?)
+            ''', (user_id, latitude, longitude, cell_lat, cell_lon, datetime.now()))
+            return cursor.lastrowid
+    
+    def save_live_location(self, user_id, latitude, longitude):
+        """Replace the user's live-location point with the latest one"""
+        cell_lat, cell_lon = grid_cell(latitude, longitude)
+        with sqlite3.connect(self.db_name) as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM locations WHERE user_id = ? AND live = 1', (user_id,))
+            cursor.execute('''
+                INSERT INTO locations (user_id, latitude, longitude, cell_lat, cell_lon, live, created_at)
+                VALUES (?, ?, ?, ?, ?, 1, ?)
+            ''', (user_id, latitude, longitude, cell_lat, cell_lon, datetime.now()))
+            return cursor.lastrowid
+    
+    def get_last_location(self, user_id, max_age_hours=None):
+        query = 'SELECT latitude, longitude FROM locations WHERE user_id = ?'
+        params = [user_id]
+        if max_age_hours is not None:
+            query += ' AND created_at >= ?'
+            params.append(datetime.now() - timedelta(hours=max_age_hours))
+        query += ' ORDER BY created_at DESC, id DESC LIMIT 1'
+        with sqlite3.connect(self.db_name) as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            return cursor.fetchone()
+    
+    def find_nearby(self, latitude, longitude, radius_km, user_id, max_age_hours=LOCATION_MAX_AGE_HOURS):
+        """
+        Find users near a point on behalf of user_id
+
+        Only users who share a group chat with user_id are returned, and only
+        if their most recent point is within radius_km and newer than
+        max_age_hours, so stale or ended live locations do not linger.
+
+        Returns:
+            list: (user_id, latitude, longitude, distance_km) tuples sorted by distance
+        """
+        min_cell_lat, max_cell_lat, min_cell_lon, max_cell_lon = cell_bounds(
+            latitude, longitude, radius_km
+        )
+        # Only consider each user's most recent point, wherever it is
+        query = '''
+            SELECT user_id, latitude, longitude FROM locations AS loc
+            WHERE cell_lat BETWEEN ? AND ?
+        '''
+        params = [min_cell_lat, max_cell_lat]
+        if min_cell_lon is not None:
+            query += ' AND cell_lon BETWEEN ? AND ?'
+            params += [min_cell_lon, max_cell_lon]
+        query += '''
+            AND loc.created_at >= ?
+            AND loc.user_id != ?
+            AND loc.user_id IN (
+                SELECT other.user_id FROM group_messages AS mine
+                JOIN group_messages AS other ON other.group_id = mine.group_id
+                WHERE mine.user_id = ?
+            )
+            AND loc.id = (
+                SELECT latest.id FROM locations AS latest
+                WHERE latest.user_id = loc.user_id
+                ORDER BY latest.created_at DESC, latest.id DESC LIMIT 1
+            )
+        '''
+        params += [datetime.now() - timedelta(hours=max_age_hours), user_id, user_id]
+        
+        with sqlite3.connect(self.db_name) as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+        
+        results = []
+        for other_id, lat, lon in rows:
+            distance = haversine_km(latitude, longitude, lat, lon)
+            if distance <= radius_km:
+                results.append((other_id, lat, lon, distance))
+        return sorted(results, key=lambda result: result[3])
+    
     def save_group_message(self, group_id, user_id, message):
         with sqlite3.connect(self.db_name) as conn:
             cursor = conn.cursor()
@@ -0,0 +1,132 @@
+import math
+import time
+import logging
+
+# Grid cells are CELL_SIZE degrees on each side (~1.1 km of latitude)
+CELL_SIZE = 0.01
+EARTH_RADIUS_KM = 6371.0
+
+# Minimum number of seconds between two stored live-location points per user
+LIVE_LOCATION_INTERVAL = 30
+
+# Points older than this are ignored by nearby searches
+LOCATION_MAX_AGE_HOURS = 6
+
+
+def grid_cell(latitude, longitude):
+    """
+    Return the (cell_lat, cell_lon) grid cell containing a point
+
+    Args:
+        latitude (float): Latitude in degrees
+        longitude (float): Longitude in degrees
+    """
+    return math.floor(latitude / CELL_SIZE), math.floor(longitude / CELL_SIZE)
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in kilometres"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = math.radians(lat2 - lat1)
+    d_lambda = math.radians(lon2 - lon1)
+    a = (math.sin(d_phi / 2) ** 2 +
+         math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def cell_bounds(latitude, longitude, radius_km):
+    """
+    Return the grid cell ranges covering a circle around a point
+
+    Returns:
+        tuple: (min_cell_lat, max_cell_lat, min_cell_lon, max_cell_lon).
+        The longitude bounds are None when the circle touches a pole or
+        crosses the antimeridian, in which case every longitude matches.
+    """
+    d_lat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    min_lat = max(-90.0, latitude - d_lat)
+    max_lat = min(90.0, latitude + d_lat)
+    min_cell_lat = math.floor(min_lat / CELL_SIZE)
+    max_cell_lat = math.floor(max_lat / CELL_SIZE)
+
+    max_abs_lat = max(abs(min_lat), abs(max_lat))
+    if max_abs_lat >= 90.0:
+        return min_cell_lat, max_cell_lat, None, None
+
+    d_lon = d_lat / math.cos(math.radians(max_abs_lat))
+    min_lon = longitude - d_lon
+    max_lon = longitude + d_lon
+    if min_lon < -180.0 or max_lon > 180.0:
+        return min_cell_lat, max_cell_lat, None, None
+
+    return (min_cell_lat, max_cell_lat,
+            math.floor(min_lon / CELL_SIZE), math.floor(max_lon / CELL_SIZE))
+
+
+class LiveLocationBuffer:
+    """
+    Coalesces live-location updates so that at most one point per user is
+    written every `min_interval` seconds. Intermediate points are dropped;
+    the most recent one is written once the interval has elapsed.
+    """
+
+    def __init__(self, db, min_interval=LIVE_LOCATION_INTERVAL, clock=time.monotonic):
+        self.db = db
+        self.min_interval = min_interval
+        self.clock = clock
+        self._pending = {}
+        self._last_write = {}
+        self._timers = {}
+
+    def update(self, user_id, latitude, longitude):
+        """
+        Record a live-location point for a user
+
+        Args:
+            user_id (int): Telegram user ID
+            latitude (float): Latitude in degrees
+            longitude (float): Longitude in degrees
+
+        Returns:
+            bool: True if the point was written immediately
+        """
+        now = self.clock()
+        last = self._last_write.get(user_id)
+        if last is None or now - last >= self.min_interval:
+            self._pending.pop(user_id, None)
+            self._cancel_timer(user_id)
+            self._write(user_id, latitude, longitude, now)
+            return True
+
+        self._pending[user_id] = (latitude, longitude)
+        if user_id not in self._timers:
+            # Imported here so DatabaseManager users don't pay for asyncio
+            import asyncio
+            delay = self.min_interval - (now - last)
+            loop = asyncio.get_running_loop()
+            self._timers[user_id] = loop.call_later(delay, self.flush_user, user_id)
+        return False
+
+    def flush(self):
+        """Write every pending point immediately"""
+        for user_id in list(self._pending):
+            self.flush_user(user_id)
+
+    def flush_user(self, user_id):
+        """Write a single user's pending point immediately, if there is one"""
+        self._cancel_timer(user_id)
+        point = self._pending.pop(user_id, None)
+        if point is not None:
+            self._write(user_id, point[0], point[1], self.clock())
+
+    def _cancel_timer(self, user_id):
+        timer = self._timers.pop(user_id, None)
+        if timer is not None:
+            timer.cancel()
+
+    def _write(self, user_id, latitude, longitude, now):
+        try:
+            self.db.save_live_location(user_id, latitude, longitude)
+            self._last_write[user_id] = now
+        except Exception as e:
+            logging.error(f"Live location write error for user {user_id}: {str(e)}")
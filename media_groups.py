@@ -0,0 +1,70 @@
+import logging
+
+# asyncio is imported inside the methods below: they only run inside the
+# event loop, where it is already loaded, and importing this module stays cheap
+
+# Seconds to wait for further items of an album after the last one arrived
+MEDIA_GROUP_WINDOW = 1.0
+
+# Maximum number of album files downloaded at the same time
+MAX_CONCURRENT_DOWNLOADS = 4
+
+
+class MediaGroupBuffer:
+    """
+    Collects updates that share a media_group_id. Telegram delivers an album
+    as one update per item, so items are held until no new item has arrived
+    for `window` seconds and then handed to `on_flush` together.
+    """
+
+    def __init__(self, on_flush, window=MEDIA_GROUP_WINDOW):
+        """
+        Args:
+            on_flush (coroutine function): Called as on_flush(media_group_id, items)
+            window (float): Quiet period in seconds that closes an album
+        """
+        self.on_flush = on_flush
+        self.window = window
+        self._groups = {}
+        self._timers = {}
+        self._tasks = set()
+
+    def add(self, media_group_id, item):
+        """Add an item to its album and restart the album's timer"""
+        self._groups.setdefault(media_group_id, []).append(item)
+
+        timer = self._timers.pop(media_group_id, None)
+        if timer is not None:
+            timer.cancel()
+        import asyncio
+        loop = asyncio.get_running_loop()
+        self._timers[media_group_id] = loop.call_later(
+            self.window, self._flush, media_group_id
+        )
+
+    async def drain(self):
+        """Flush every open album now and wait for all flushes to finish"""
+        for media_group_id in list(self._groups):
+            self._flush(media_group_id)
+        if self._tasks:
+            import asyncio
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _flush(self, media_group_id):
+        timer = self._timers.pop(media_group_id, None)
+        if timer is not None:
+            timer.cancel()
+        items = self._groups.pop(media_group_id, None)
+        if not items:
+            return
+
+        import asyncio
+        task = asyncio.ensure_future(self._run(media_group_id, items))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, media_group_id, items):
+        try:
+            await self.on_flush(media_group_id, items)
+        except Exception as e:
+            logging.error(f"Album {media_group_id} handling error: {str(e)}")
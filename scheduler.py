@@ -1,19 +1,34 @@
 # scheduler.py
-from apscheduler.schedulers.background import BackgroundScheduler
 from datetime import datetime, timedelta
 import logging
 import sqlite3
 
 class ScheduleManager:
     def __init__(self, db):
-        self.scheduler = BackgroundScheduler()
+        self._scheduler = None
+        self._started = False
         self.db = db
         logging.basicConfig()
         logging.getLogger('apscheduler').setLevel(logging.DEBUG)
 
+    @property
+    def scheduler(self):
+        """
+        The APScheduler instance, imported and created on first use so that
+        startup does not pay for it until a task is actually scheduled
+        """
+        if self._scheduler is None:
+            from apscheduler.schedulers.background import BackgroundScheduler
+            self._scheduler = BackgroundScheduler()
+            if self._started:
+                self._scheduler.start()
+        return self._scheduler
+
     def start(self):
-        """Start the background scheduler"""
-        self.scheduler.start()
+        """Start the background scheduler (deferred until first use)"""
+        self._started = True
+        if self._scheduler is not None and not self._scheduler.running:
+            self._scheduler.start()
         
     def schedule_task(self, task_id, delay, description):
         """
@@ -170,4 +185,6 @@ class ScheduleManager:
 
     def stop(self):
         """Shutdown the scheduler"""
-        self.scheduler.shutdown()
\ No newline at end of file
+        self._started = False
+        if self._scheduler is not None and self._scheduler.running:
+            self._scheduler.shutdown()
\ No newline at end of file
@@ -1,8 +1,11 @@
+import asyncio
 import unittest
 import os
 import sqlite3
 import time
+import tempfile
 from contextlib import contextmanager
+from types import SimpleNamespace
 
 class DatabaseTestBase:
     """Base class for database testing with improved connection handling"""
@@ -164,5 +167,418 @@ class TestDatabaseManagerEdgeCases(DatabaseTestBase, unittest.TestCase):
         tasks = self.db.list_tasks(self.test_user_id)
         self.assertEqual(len(tasks), 2)
 
+class TestLocations(DatabaseTestBase, unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.db_path = 'test_bot.db'
+        cls.remove_db_file()
+
+    def setUp(self):
+        from database import DatabaseManager
+        self.db = DatabaseManager(self.db_path)
+        self.test_user_id = 12345
+        self.test_group_id = 67890
+
+    def tearDown(self):
+        if hasattr(self, 'db'):
+            self.db.close()
+            delattr(self, 'db')
+        
+        import gc
+        gc.collect()
+        time.sleep(0.1)
+        
+        self.remove_db_file()
+
+    def test_save_location_numeric_columns(self):
+        """Test locations are stored as numbers with their grid cell"""
+        self.db.save_location(self.test_user_id, 52.5200, 13.4050)
+
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                'SELECT latitude, longitude, cell_lat, cell_lon, live FROM locations WHERE user_id = ?',
+                (self.test_user_id,)
+            )
+            result = cursor.fetchall()
+
+        self.assertEqual(result, [(52.52, 13.405, 5252, 1340, 0)])
+
+    def test_live_location_keeps_latest_point(self):
+        """Test live updates replace the previous live point"""
+        self.db.save_live_location(self.test_user_id, 52.5200, 13.4050)
+        self.db.save_live_location(self.test_user_id, 52.5300, 13.4100)
+
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                'SELECT latitude, longitude FROM locations WHERE user_id = ? AND live = 1',
+                (self.test_user_id,)
+            )
+            result = cursor.fetchall()
+
+        self.assertEqual(result, [(52.53, 13.41)])
+        self.assertEqual(self.db.get_last_location(self.test_user_id), (52.53, 13.41))
+
+    def test_find_nearby(self):
+        """Test radius lookups use each user's latest point"""
+        for user_id in (1, 2, 3, 4):
+            self.db.save_group_message(self.test_group_id, user_id, 'hi')
+        self.db.save_location(1, 52.5200, 13.4050)   # origin
+        self.db.save_location(2, 52.5250, 13.4100)   # ~0.65 km away
+        self.db.save_location(3, 52.5200, 13.5500)   # ~9.8 km away
+        self.db.save_location(4, 52.5210, 13.4060)   # close, but then moved away
+        self.db.save_location(4, 48.8566, 2.3522)
+
+        results = self.db.find_nearby(52.5200, 13.4050, 1.0, 1)
+        self.assertEqual([r[0] for r in results], [2])
+
+        results = self.db.find_nearby(52.5200, 13.4050, 15.0, 1)
+        self.assertEqual([r[0] for r in results], [2, 3])
+
+    def test_find_nearby_requires_shared_group(self):
+        """Test users who share no group with the caller are not returned"""
+        self.db.save_group_message(self.test_group_id, 1, 'hi')
+        self.db.save_group_message(self.test_group_id, 2, 'hi')
+        self.db.save_group_message(self.test_group_id + 1, 3, 'hi')
+        self.db.save_location(2, 52.5250, 13.4100)
+        self.db.save_location(3, 52.5250, 13.4100)
+
+        results = self.db.find_nearby(52.5200, 13.4050, 1.0, 1)
+        self.assertEqual([r[0] for r in results], [2])
+
+    def test_find_nearby_ignores_stale_points(self):
+        """Test points older than the age cutoff are not returned"""
+        from datetime import datetime, timedelta
+        self.db.save_group_message(self.test_group_id, 1, 'hi')
+        self.db.save_group_message(self.test_group_id, 2, 'hi')
+        self.db.save_live_location(2, 52.5250, 13.4100)
+        with self.get_connection() as conn:
+            conn.execute(
+                'UPDATE locations SET created_at = ? WHERE user_id = 2',
+                (datetime.now() - timedelta(hours=7),)
+            )
+            conn.commit()
+
+        self.assertEqual(self.db.find_nearby(52.5200, 13.4050, 1.0, 1, max_age_hours=6), [])
+        self.assertEqual(len(self.db.find_nearby(52.5200, 13.4050, 1.0, 1, max_age_hours=8)), 1)
+
+    def test_legacy_media_locations_migrated(self):
+        """Test "lat,lon" media rows are moved into the locations table"""
+        self.db.close()
+        del self.db
+        self.remove_db_file()
+        with self.get_connection() as conn:
+            conn.execute(
+                'CREATE TABLE media (id INTEGER PRIMARY KEY, type TEXT, content TEXT, '
+                'caption TEXT, user_id INTEGER, created_at TIMESTAMP)'
+            )
+            conn.execute(
+                "INSERT INTO media (type, content, caption, user_id) VALUES ('location', '10.5,20.25', '', ?)",
+                (self.test_user_id,)
+            )
+            conn.execute(
+                "INSERT INTO media (type, content, caption, user_id) VALUES ('location', 'bad', '', ?)",
+                (self.test_user_id,)
+            )
+            conn.commit()
+
+        from database import DatabaseManager
+        self.db = DatabaseManager(self.db_path)
+
+        self.assertEqual(self.db.get_last_location(self.test_user_id), (10.5, 20.25))
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT content FROM media WHERE type = 'location'")
+            # The malformed row is left in place rather than deleted
+            self.assertEqual(cursor.fetchall(), [('bad',)])
+            cursor.execute('SELECT COUNT(*) FROM locations')
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+class TestLiveLocationBuffer(unittest.IsolatedAsyncioTestCase):
+    class FakeDatabase:
+        def __init__(self):
+            self.writes = []
+
+        def save_live_location(self, user_id, latitude, longitude):
+            self.writes.append((user_id, latitude, longitude))
+
+    async def test_updates_coalesced(self):
+        """Test only the latest point is written within the interval"""
+        from locations import LiveLocationBuffer
+        now = [0.0]
+        db = self.FakeDatabase()
+        buffer = LiveLocationBuffer(db, min_interval=30, clock=lambda: now[0])
+
+        self.assertTrue(buffer.update(1, 1.0, 1.0))
+        now[0] = 5.0
+        self.assertFalse(buffer.update(1, 2.0, 2.0))
+        now[0] = 10.0
+        self.assertFalse(buffer.update(1, 3.0, 3.0))
+        self.assertEqual(db.writes, [(1, 1.0, 1.0)])
+
+        buffer.flush()
+        self.assertEqual(db.writes, [(1, 1.0, 1.0), (1, 3.0, 3.0)])
+
+    async def test_flush_user_only_writes_that_user(self):
+        """Test flushing one user leaves other users rate limited"""
+        from locations import LiveLocationBuffer
+        now = [0.0]
+        db = self.FakeDatabase()
+        buffer = LiveLocationBuffer(db, min_interval=30, clock=lambda: now[0])
+
+        buffer.update(1, 1.0, 1.0)
+        buffer.update(2, 5.0, 5.0)
+        now[0] = 5.0
+        buffer.update(1, 2.0, 2.0)
+        buffer.update(2, 6.0, 6.0)
+
+        buffer.flush_user(1)
+        self.assertEqual(db.writes, [(1, 1.0, 1.0), (2, 5.0, 5.0), (1, 2.0, 2.0)])
+        buffer.flush()
+
+    async def test_pending_point_written_after_interval(self):
+        """Test a pending point is written once the interval elapses"""
+        from locations import LiveLocationBuffer
+        db = self.FakeDatabase()
+        buffer = LiveLocationBuffer(db, min_interval=0.05)
+
+        buffer.update(1, 1.0, 1.0)
+        buffer.update(1, 2.0, 2.0)
+        await asyncio.sleep(0.1)
+
+        self.assertEqual(db.writes, [(1, 1.0, 1.0), (1, 2.0, 2.0)])
+
+class TestMediaGroups(DatabaseTestBase, unittest.IsolatedAsyncioTestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.db_path = 'test_bot.db'
+        cls.remove_db_file()
+
+    def setUp(self):
+        from database import DatabaseManager
+        self.db = DatabaseManager(self.db_path)
+        self.test_user_id = 12345
+
+    def tearDown(self):
+        if hasattr(self, 'db'):
+            self.db.close()
+            delattr(self, 'db')
+        
+        import gc
+        gc.collect()
+        time.sleep(0.1)
+        
+        self.remove_db_file()
+
+    def test_save_media_batch(self):
+        """Test an album is saved as one row per item"""
+        self.db.save_media_batch([
+            ('photo', 'photos/a.jpg', 'Holiday'),
+            ('photo', 'photos/b.jpg', 'No caption'),
+            ('document', 'documents/c.pdf', 'c.pdf'),
+        ], self.test_user_id)
+
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                'SELECT type, content, caption FROM media WHERE user_id = ? ORDER BY id',
+                (self.test_user_id,)
+            )
+            result = cursor.fetchall()
+
+        self.assertEqual(len(result), 3)
+        self.assertEqual(result[2], ('document', 'documents/c.pdf', 'c.pdf'))
+
+    async def test_buffer_groups_items(self):
+        """Test items sharing a media_group_id are flushed together"""
+        from media_groups import MediaGroupBuffer
+        flushed = []
+
+        async def on_flush(media_group_id, items):
+            flushed.append((media_group_id, items))
+
+        buffer = MediaGroupBuffer(on_flush, window=0.05)
+        buffer.add('album1', 1)
+        buffer.add('album2', 'a')
+        buffer.add('album1', 2)
+        buffer.add('album1', 3)
+        await asyncio.sleep(0.15)
+        await buffer.drain()
+
+        self.assertEqual(sorted(flushed), [('album1', [1, 2, 3]), ('album2', ['a'])])
+
+    async def test_buffer_drain(self):
+        """Test drain flushes open albums without waiting for the window"""
+        from media_groups import MediaGroupBuffer
+        flushed = []
+
+        async def on_flush(media_group_id, items):
+            flushed.append((media_group_id, items))
+
+        buffer = MediaGroupBuffer(on_flush, window=60)
+        buffer.add('album1', 1)
+        await buffer.drain()
+
+        self.assertEqual(flushed, [('album1', [1])])
+
+class TestStartup(DatabaseTestBase, unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.db_path = 'test_bot.db'
+        cls.remove_db_file()
+
+    def tearDown(self):
+        import gc
+        gc.collect()
+        time.sleep(0.1)
+        
+        self.remove_db_file()
+
+    def test_schema_version_recorded(self):
+        """Test setup stores the schema version in PRAGMA user_version"""
+        from database import DatabaseManager, SCHEMA_VERSION
+        DatabaseManager(self.db_path)
+
+        with self.get_connection() as conn:
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+
+        self.assertEqual(version, SCHEMA_VERSION)
+
+    def test_ddl_skipped_when_schema_current(self):
+        """Test setup does not rerun the DDL on an up-to-date database"""
+        from database import DatabaseManager
+        DatabaseManager(self.db_path)
+        with self.get_connection() as conn:
+            conn.execute('DROP TABLE polls')
+            conn.commit()
+
+        DatabaseManager(self.db_path)
+
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'polls'")
+            self.assertIsNone(cursor.fetchone())
+
+    def test_upgrade_adds_group_message_indexes(self):
+        """Test a version 1 database gets the group_messages indexes"""
+        from database import DatabaseManager, SCHEMA_VERSION
+        DatabaseManager(self.db_path)
+        with self.get_connection() as conn:
+            conn.execute('DROP INDEX idx_group_messages_user')
+            conn.execute('DROP INDEX idx_group_messages_group')
+            conn.execute('PRAGMA user_version = 1')
+            conn.commit()
+
+        DatabaseManager(self.db_path)
+
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'group_messages'"
+            )
+            self.assertEqual(
+                sorted(row[0] for row in cursor.fetchall()),
+                ['idx_group_messages_group', 'idx_group_messages_user']
+            )
+            self.assertEqual(conn.execute('PRAGMA user_version').fetchone()[0], SCHEMA_VERSION)
+
+    def test_scheduler_created_lazily(self):
+        """Test ScheduleManager does not build APScheduler until first use"""
+        from database import DatabaseManager
+        from scheduler import ScheduleManager
+        manager = ScheduleManager(DatabaseManager(self.db_path))
+        manager.start()
+
+        self.assertIsNone(manager._scheduler)
+        manager.stop()
+
+class TestSaveAlbum(unittest.IsolatedAsyncioTestCase):
+    """Exercise TelegramBot.save_album with stub Telegram objects"""
+
+    class FakeFile:
+        def __init__(self, stats, fail):
+            self.stats = stats
+            self.fail = fail
+
+        async def download_to_drive(self, file_path):
+            self.stats['active'] += 1
+            self.stats['peak'] = max(self.stats['peak'], self.stats['active'])
+            await asyncio.sleep(0.01)
+            self.stats['active'] -= 1
+            if self.fail:
+                raise IOError('download failed')
+
+    class FakeBot:
+        def __init__(self, stats, failing_ids):
+            self.stats = stats
+            self.failing_ids = failing_ids
+
+        async def get_file(self, file_id):
+            return TestSaveAlbum.FakeFile(self.stats, file_id in self.failing_ids)
+
+    class FakeMessage:
+        def __init__(self, file_id, replies):
+            self.document = None
+            self.photo = [SimpleNamespace(file_id=file_id)]
+            self.caption = None
+            self.media_group_id = 'album'
+            self.replies = replies
+
+        async def reply_text(self, text):
+            self.replies.append(text)
+
+    def setUp(self):
+        self.original_cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+
+        from bot import TelegramBot
+        self.bot = TelegramBot('123:TEST', db_name='album.db')
+        self.stats = {'active': 0, 'peak': 0}
+        self.replies = []
+        self.batches = []
+        save_media_batch = self.bot.db.save_media_batch
+
+        def record_batch(items, user_id):
+            self.batches.append(list(items))
+            save_media_batch(items, user_id)
+
+        self.bot.db.save_media_batch = record_batch
+
+    def tearDown(self):
+        os.chdir(self.original_cwd)
+        self.tmp.cleanup()
+
+    def make_items(self, count, failing_ids=()):
+        context = SimpleNamespace(bot=self.FakeBot(self.stats, set(failing_ids)))
+        user = SimpleNamespace(id=12345)
+        return [
+            (SimpleNamespace(message=self.FakeMessage(f'file{i}', self.replies), effective_user=user), context)
+            for i in range(count)
+        ]
+
+    async def test_album_saved_in_one_batch(self):
+        """Test downloads are bounded and the album is saved and answered once"""
+        from media_groups import MAX_CONCURRENT_DOWNLOADS
+        await self.bot.save_album('album', self.make_items(10, failing_ids={'file3'}))
+
+        self.assertEqual(self.stats['peak'], MAX_CONCURRENT_DOWNLOADS)
+        self.assertEqual(len(self.batches), 1)
+        self.assertEqual(len(self.batches[0]), 9)
+        self.assertEqual(self.replies, [
+            'Album saved: 9 photo(s), 0 document(s). 1 item(s) failed, please try again.'
+        ])
+
+    async def test_album_save_error_replies(self):
+        """Test a database failure still sends a single failure reply"""
+        def fail(items, user_id):
+            raise sqlite3.OperationalError('database is locked')
+
+        self.bot.db.save_media_batch = fail
+        await self.bot.save_album('album', self.make_items(3))
+
+        self.assertEqual(self.replies, ['Failed to process album. Please try again.'])
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file